@@ -2,10 +2,8 @@
 """Process listed buildings CSV data with proper coordinate transformation"""
 
 import pandas as pd
-import json
+import geopandas as gpd
 from pathlib import Path
-import subprocess
-import tempfile
 
 # Read CSV
 df = pd.read_csv("data/listed_buildings.csv")
@@ -21,81 +19,49 @@ df['easting'] = pd.to_numeric(df['easting'], errors='coerce')
 df['northing'] = pd.to_numeric(df['northing'], errors='coerce')
 df = df.dropna(subset=['easting', 'northing'])
 
-print(f"Processing {len(df)} records...")
+# A few malformed rows make pandas read list_entry_number as mixed int/str;
+# store it as text like ogr2ogr used to, so Parquet gets a single column type
+df['list_entry_number'] = df['list_entry_number'].astype(str)
 
-# Create a temporary GeoJSON in EPSG:27700
-temp_27700 = tempfile.NamedTemporaryFile(mode='w', suffix='.geojson', delete=False)
+print(f"Processing {len(df)} records...")
 
 # Fields to exclude from the output
 # Also excluding nhle_link since it always follows the pattern:
 # https://historicengland.org.uk/listing/the-list/list-entry/{list_entry_number}
 exclude_fields = ['easting', 'northing', 'objectid', 'capture_scale', 'national_grid_reference', 'nhle_link']
 
-features = []
-for idx, row in df.iterrows():
-    # Clean properties - replace NaN with None for JSON compatibility
-    properties = {}
-    for key, value in row.items():
-        # Skip excluded fields
-        if key.lower() in exclude_fields:
-            continue
-        if pd.isna(value):
-            properties[key] = None
-        else:
-            properties[key] = value
-    
-    feature = {
-        "type": "Feature",
-        "properties": properties,
-        "geometry": {
-            "type": "Point",
-            "coordinates": [float(row['easting']), float(row['northing'])]
-        }
-    }
-    features.append(feature)
-
-geojson_27700 = {
-    "type": "FeatureCollection",
-    "features": features
-}
-
-with open(temp_27700.name, 'w') as f:
-    json.dump(geojson_27700, f)
+# Replace NaN with None for JSON compatibility, one vectorized pass over the text
+# columns; numeric columns keep their dtype since the writers emit NaN as null
+properties = df.drop(columns=[col for col in df.columns if col.lower() in exclude_fields])
+text_cols = properties.select_dtypes(include='object').columns
+properties[text_cols] = properties[text_cols].where(properties[text_cols].notna(), None)
+
+# Build all points in one vectorized call, in EPSG:27700 (OSGB 1936 / British National Grid)
+gdf = gpd.GeoDataFrame(
+    properties,
+    geometry=gpd.points_from_xy(df['easting'], df['northing']),
+    crs="EPSG:27700"
+)
 
 # Save outputs
 Path("build").mkdir(exist_ok=True)
 
-# Use ogr2ogr to convert from OSGB 1936 British National Grid to EPSG:4326
-# EPSG:27700 is OSGB 1936 / British National Grid
+gdf_27700 = gdf
+
 print("Converting coordinates from OSGB 1936 (EPSG:27700) to WGS84 (EPSG:4326)...")
-cmd = [
-    'ogr2ogr', '-f', 'GeoJSON',
-    '-s_srs', '+proj=tmerc +lat_0=49 +lon_0=-2 +k=0.9996012717 +x_0=400000 +y_0=-100000 +ellps=airy +datum=OSGB36 +units=m +no_defs',
-    '-t_srs', 'EPSG:4326',
-    'build/listed_buildings.geojson',
-    temp_27700.name
-]
-result = subprocess.run(cmd, capture_output=True, text=True)
-if result.returncode != 0:
-    print(f"Error in ogr2ogr: {result.stderr}")
-    exit(1)
-
-# Clean up temp file
-Path(temp_27700.name).unlink()
-
-print(f"Saved {len(df)} records to build/listed_buildings.geojson")
+gdf = gdf.to_crs("EPSG:4326")
+
+gdf.to_parquet("build/listed_buildings.parquet")
+gdf.to_file("build/listed_buildings.geojson", driver="GeoJSON")
+# Binary copy for tippecanoe, which parses it much faster than GeoJSON
+gdf.to_file("build/listed_buildings.fgb", driver="FlatGeobuf", SPATIAL_INDEX="NO")
+
+# Keep a copy in the native CRS so hotspot processing can skip reprojecting back.
+# Written last: hotspots only trusts a sidecar at least as new as the WGS84 Parquet
+gdf_27700.to_parquet("build/listed_buildings_27700.parquet")
+
+print(f"Saved {len(gdf)} records to build/listed_buildings.parquet, .geojson, .fgb and _27700.parquet")
 
 # Print bounds
-with open('build/listed_buildings.geojson', 'r') as f:
-    data = json.load(f)
-    
-min_lon = min_lat = float('inf')
-max_lon = max_lat = float('-inf')
-for feature in data['features']:
-    lon, lat = feature['geometry']['coordinates']
-    min_lon = min(min_lon, lon)
-    max_lon = max(max_lon, lon)
-    min_lat = min(min_lat, lat)
-    max_lat = max(max_lat, lat)
-    
-print(f"Bounds: [{min_lon}, {min_lat}, {max_lon}, {max_lat}]")
\ No newline at end of file
+min_lon, min_lat, max_lon, max_lat = gdf.total_bounds
+print(f"Bounds: [{min_lon}, {min_lat}, {max_lon}, {max_lat}]")
@@ -1,7 +1,8 @@
 import typer
 from pathlib import Path
+from typing import Optional
 from src.logging_cfg import get_logger
-from src.io_utils import read_csv_to_gdf, save_gdf, load_gdf
+from src.io_utils import read_csv_to_gdf, save_gdf, load_gdf, normalize_column_names
 from src.geom_ops import create_hotspots
 from src.tiler import package_tiles
 import pandas as pd
@@ -14,6 +15,18 @@ app = typer.Typer(
     help="Listed Buildings Map CLI - Process and tile historic building data"
 )
 
+POINTS_PARQUET = Path("build/listed_buildings.parquet")
+
+def projected_points_path(proj_crs: str) -> Optional[Path]:
+    """Path of the points sidecar Parquet stored in a metric CRS, e.g. EPSG:3857 -> _3857.
+    
+    Only plain EPSG codes get a sidecar; other CRS definitions return None.
+    """
+    authority, _, code = proj_crs.strip().partition(":")
+    if authority.upper() != "EPSG" or not code.isdigit():
+        return None
+    return Path(f"build/listed_buildings_{code}.parquet")
+
 @app.command()
 def ingest(
     csv_path: Path = typer.Option("data/listed_buildings.csv", help="Path to CSV file"),
@@ -21,13 +34,16 @@ def ingest(
     lat_col: str = typer.Option(None, help="Latitude column name"),
     x_col: str = typer.Option(None, help="X/Easting column name"),
     y_col: str = typer.Option(None, help="Y/Northing column name"),
-    src_crs: str = typer.Option("EPSG:27700", help="Source CRS for x/y coordinates")
+    src_crs: str = typer.Option("EPSG:27700", help="Source CRS for x/y coordinates"),
+    proj_crs: str = typer.Option("EPSG:3857", help="Metric CRS of the points sidecar used by hotspots"),
+    chunksize: int = typer.Option(None, help="Read the CSV in blocks of this many rows to cap memory")
 ):
     """
     Ingest CSV data and convert to GeoJSON/Parquet.
     
     Reads listed buildings CSV, auto-detects or uses specified coordinate columns,
-    and outputs to build/listed_buildings.geojson and .parquet
+    and outputs to build/listed_buildings.geojson, .parquet and .fgb, plus a copy
+    projected to proj_crs so hotspots can skip reprojecting the points
     """
     logger.info("=" * 60)
     logger.info("INGEST: Starting CSV ingestion")
@@ -35,34 +51,43 @@ def ingest(
     
     if lon_col and lat_col:
         logger.info(f"Using specified lon/lat columns: {lon_col}, {lat_col}")
-        gdf = read_csv_to_gdf(csv_path, lon_col=lon_col, lat_col=lat_col)
+        gdf = read_csv_to_gdf(csv_path, lon_col=lon_col, lat_col=lat_col, chunksize=chunksize)
     elif x_col and y_col:
         logger.info(f"Using specified x/y columns: {x_col}, {y_col} with CRS {src_crs}")
-        gdf = read_csv_to_gdf(csv_path, x_col=x_col, y_col=y_col, src_crs=src_crs)
+        gdf = read_csv_to_gdf(csv_path, x_col=x_col, y_col=y_col, src_crs=src_crs, chunksize=chunksize)
     else:
         logger.info("No coordinate columns specified, attempting auto-detection")
         df = pd.read_csv(csv_path, nrows=5)
-        cols_lower = [col.lower().replace(' ', '_').replace('-', '_') for col in df.columns]
+        cols_lower = list(normalize_column_names(df).columns)
         
         if 'longitude' in cols_lower and 'latitude' in cols_lower:
             logger.info("Auto-detected: longitude/latitude columns")
-            gdf = read_csv_to_gdf(csv_path, lon_col='longitude', lat_col='latitude')
+            gdf = read_csv_to_gdf(csv_path, lon_col='longitude', lat_col='latitude', chunksize=chunksize)
         elif 'lon' in cols_lower and 'lat' in cols_lower:
             logger.info("Auto-detected: lon/lat columns")
-            gdf = read_csv_to_gdf(csv_path, lon_col='lon', lat_col='lat')
+            gdf = read_csv_to_gdf(csv_path, lon_col='lon', lat_col='lat', chunksize=chunksize)
         elif 'easting' in cols_lower and 'northing' in cols_lower:
             logger.info(f"Auto-detected: easting/northing columns with CRS {src_crs}")
-            gdf = read_csv_to_gdf(csv_path, x_col='easting', y_col='northing', src_crs=src_crs)
+            gdf = read_csv_to_gdf(csv_path, x_col='easting', y_col='northing', src_crs=src_crs, chunksize=chunksize)
         elif 'x' in cols_lower and 'y' in cols_lower:
             logger.info(f"Auto-detected: x/y columns with CRS {src_crs}")
-            gdf = read_csv_to_gdf(csv_path, x_col='x', y_col='y', src_crs=src_crs)
+            gdf = read_csv_to_gdf(csv_path, x_col='x', y_col='y', src_crs=src_crs, chunksize=chunksize)
         else:
             available_cols = list(df.columns)[:20]
             logger.error(f"Could not auto-detect coordinate columns. Available: {available_cols}")
             raise ValueError("Could not auto-detect coordinate columns. Please specify manually.")
     
     # Save outputs
-    save_gdf(gdf, "build/listed_buildings.parquet", "build/listed_buildings.geojson")
+    save_gdf(
+        gdf,
+        POINTS_PARQUET,
+        "build/listed_buildings.geojson",
+        "build/listed_buildings.fgb"
+    )
+    # Written after the WGS84 Parquet so hotspots can tell it is current
+    sidecar_path = projected_points_path(proj_crs)
+    if sidecar_path:
+        save_gdf(gdf.to_crs(proj_crs), sidecar_path)
     
     # Log summary statistics
     bounds = gdf.total_bounds
@@ -78,26 +103,42 @@ def hotspots(
     buffer: float = typer.Option(200, help="Buffer radius in meters"),
     negative_buffer: float = typer.Option(0, help="Negative buffer in meters (shrink after union)"),
     min_area: float = typer.Option(1000, help="Minimum area in square meters"),
-    proj_crs: str = typer.Option("EPSG:3857", help="Projection CRS for metric operations")
+    min_points: int = typer.Option(0, help="Minimum number of points inside a hotspot"),
+    proj_crs: str = typer.Option("EPSG:3857", help="Projection CRS for metric operations"),
+    quad_segs: int = typer.Option(8, help="Segments per quarter circle when buffering points")
 ):
     """
     Generate hotspot polygons from point data.
     
-    Reads points, runs buffer→union→optional negative buffer→area filter pipeline,
-    and outputs to build/hotspots.geojson and .parquet
+    Reads points, runs buffer→union→optional negative buffer→area/point-count filter pipeline,
+    and outputs to build/hotspots.geojson, .parquet and .fgb, plus
+    build/hotspots_27700.parquet when proj_crs is EPSG:27700
     """
     logger.info("=" * 60)
     logger.info("HOTSPOTS: Starting hotspot generation")
     logger.info("=" * 60)
     
-    # Load points
-    parquet_path = Path("build/listed_buildings.parquet")
+    # Load points, preferring the sidecar already projected to proj_crs as long
+    # as it is at least as new as the WGS84 Parquet; an older one is left over
+    # from a previous ingest and would silently yield hotspots for stale data
+    parquet_path = POINTS_PARQUET
+    sidecar_path = projected_points_path(proj_crs)
+    if (
+        sidecar_path
+        and sidecar_path.exists()
+        and (not POINTS_PARQUET.exists()
+             or sidecar_path.stat().st_mtime >= POINTS_PARQUET.stat().st_mtime)
+    ):
+        parquet_path = sidecar_path
+    elif sidecar_path and sidecar_path.exists():
+        logger.warning(f"Ignoring {sidecar_path}: older than {POINTS_PARQUET}")
     if not parquet_path.exists():
         logger.error(f"Points file not found: {parquet_path}")
         logger.error("Run 'ingest' command first")
         raise typer.Exit(1)
     
-    gdf = load_gdf(parquet_path)
+    # Hotspots only need point locations, so skip the attribute columns
+    gdf = load_gdf(parquet_path, columns=[])
     logger.info(f"Loaded {len(gdf)} points")
     
     # Generate hotspots
@@ -106,11 +147,16 @@ def hotspots(
         buffer_meters=buffer,
         negative_buffer_meters=negative_buffer,
         min_area_sqm=min_area,
-        proj_crs=proj_crs
+        min_points=min_points,
+        proj_crs=proj_crs,
+        quad_segs=quad_segs
     )
     
     # Save outputs
-    save_gdf(hotspots_gdf, "build/hotspots.parquet", "build/hotspots.geojson")
+    save_gdf(hotspots_gdf, "build/hotspots.parquet", "build/hotspots.geojson", "build/hotspots.fgb")
+    # British National Grid runs (the Makefile/CI setting) also keep a metric copy
+    if proj_crs.strip().upper() == "EPSG:27700":
+        save_gdf(hotspots_gdf.to_crs(proj_crs), "build/hotspots_27700.parquet")
     
     # Log summary
     if len(hotspots_gdf) > 0:
@@ -127,14 +173,14 @@ def hotspots(
 
 @app.command()
 def package(
-    points: Path = typer.Option("build/listed_buildings.geojson", help="Points GeoJSON path"),
-    polys: Path = typer.Option("build/hotspots.geojson", help="Polygons GeoJSON path"),
+    points: Path = typer.Option("build/listed_buildings.fgb", help="Points FlatGeobuf or GeoJSON path"),
+    polys: Path = typer.Option("build/hotspots.fgb", help="Polygons FlatGeobuf or GeoJSON path"),
     docs_dir: Path = typer.Option("docs/tiles", help="Output directory for tiles"),
     min_zoom: int = typer.Option(4, help="Minimum zoom level"),
     max_zoom: int = typer.Option(14, help="Maximum zoom level")
 ):
     """
-    Package GeoJSON into PMTiles for web serving.
+    Package FlatGeobuf or GeoJSON into PMTiles for web serving.
     
     Calls tippecanoe to produce docs/tiles/listed_buildings.pmtiles
     and docs/tiles/hotspots.pmtiles, logging counts, bounds, and file sizes.
@@ -143,6 +189,12 @@ def package(
     logger.info("PACKAGE: Starting tile packaging")
     logger.info("=" * 60)
     
+    # Outputs of older runs (or ingest.py) may only exist as GeoJSON
+    if not points.exists() and points.with_suffix(".geojson").exists():
+        points = points.with_suffix(".geojson")
+    if not polys.exists() and polys.with_suffix(".geojson").exists():
+        polys = polys.with_suffix(".geojson")
+    
     # Check input files exist
     if not points.exists():
         logger.error(f"Points file not found: {points}")
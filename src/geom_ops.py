@@ -1,5 +1,8 @@
 import geopandas as gpd
-from shapely.ops import unary_union
+import numpy as np
+import shapely
+import os
+from concurrent.futures import ThreadPoolExecutor
 from shapely.geometry import Polygon, MultiPolygon
 from typing import Union, Optional
 from pathlib import Path
@@ -9,59 +12,115 @@ logger = get_logger(__name__)
 
 def reproject_to_metric(gdf: gpd.GeoDataFrame, proj_crs: str = "EPSG:3857") -> gpd.GeoDataFrame:
     """Reproject GeoDataFrame to a metric CRS."""
+    if gdf.crs is not None and gdf.crs == proj_crs:
+        logger.info(f"Features already in {proj_crs}, skipping reprojection")
+        return gdf
     logger.info(f"Reprojecting {len(gdf)} features from {gdf.crs} to {proj_crs}")
     gdf_proj = gdf.to_crs(proj_crs)
     return gdf_proj
 
-def buffer_points(gdf: gpd.GeoDataFrame, buffer_meters: float) -> gpd.GeoSeries:
-    """Buffer all points by specified distance in meters."""
-    logger.info(f"Buffering {len(gdf)} points by {buffer_meters}m")
-    buffered = gdf.geometry.buffer(buffer_meters)
+def buffer_points(gdf: gpd.GeoDataFrame, buffer_meters: float, quad_segs: int = 8) -> np.ndarray:
+    """Buffer all distinct point locations by specified distance in meters."""
+    # Stacked points buffer to identical disks, so each location is buffered once
+    coords = np.unique(shapely.get_coordinates(gdf.geometry.values), axis=0)
+    logger.info(
+        f"Buffering {len(coords)} distinct locations ({len(gdf)} points) by {buffer_meters}m "
+        f"({quad_segs} segments per quarter circle)"
+    )
+    buffered = shapely.buffer(shapely.points(coords), buffer_meters, quad_segs=quad_segs)
     return buffered
 
-def dissolve_geometries(geometries: gpd.GeoSeries) -> Union[Polygon, MultiPolygon]:
-    """Dissolve overlapping geometries using unary union."""
-    logger.info("Dissolving overlapping geometries")
-    union_geom = unary_union(geometries)
+def dissolve_geometries(geometries: np.ndarray) -> Union[Polygon, MultiPolygon]:
+    """Dissolve overlapping geometries, unioning chunks in parallel threads."""
+    geometries = np.asarray(geometries)
+    if len(geometries) == 0:
+        return shapely.union_all(geometries)
+    
+    # Chunk size grows with sqrt(N * vertices per geometry) so per-chunk union work stays balanced
+    vertices = shapely.get_num_coordinates(geometries).mean()
+    chunk_size = int(max(1000, min(20000, (len(geometries) * vertices) ** 0.5)))
+    chunks = [geometries[i:i + chunk_size] for i in range(0, len(geometries), chunk_size)]
+    workers = os.cpu_count() or 1
+    logger.info(f"Dissolving {len(geometries)} geometries in {len(chunks)} chunks on {workers} threads")
+    
+    # GEOS releases the GIL, so chunks are unioned in parallel; union_all then
+    # merges the chunk results with GEOS's cascaded union
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        chunk_unions = list(executor.map(shapely.union_all, chunks))
+    union_geom = shapely.union_all(chunk_unions)
     return union_geom
 
 def apply_negative_buffer(geom: Union[Polygon, MultiPolygon], negative_buffer_meters: float) -> Union[Polygon, MultiPolygon]:
     """Apply negative buffer to shrink geometry."""
     if negative_buffer_meters > 0:
         logger.info(f"Applying {negative_buffer_meters}m negative buffer")
-        geom = geom.buffer(-negative_buffer_meters)
+        # Parts of a dissolved geometry are disjoint, so shrinking each part on its own
+        # is equivalent up to the arc approximation (it leaves ~0.4% more area as thin
+        # slivers near the inset boundary) and lets GEOS work on small polygons
+        shrunk = shapely.buffer(shapely.get_parts(geom), -negative_buffer_meters)
+        parts = shapely.get_parts(shrunk)
+        geom = shapely.multipolygons(parts[~shapely.is_empty(parts)])
     return geom
 
-def explode_multipart(geom: Union[Polygon, MultiPolygon]) -> list:
+def explode_multipart(geom: Union[Polygon, MultiPolygon]) -> np.ndarray:
     """Explode multipart geometries to individual parts."""
-    if hasattr(geom, 'geoms'):
-        polygons = list(geom.geoms)
+    polygons = shapely.get_parts(geom)
+    polygons = polygons[~shapely.is_empty(polygons)]
+    if len(polygons) > 1:
         logger.info(f"Exploded multipart geometry to {len(polygons)} parts")
-    else:
-        polygons = [geom] if not geom.is_empty else []
     return polygons
 
-def compute_areas(polygons: list, crs: str) -> list:
+def compute_areas(polygons: np.ndarray, crs: str) -> np.ndarray:
     """Compute area in square meters for each polygon."""
-    areas = [p.area for p in polygons]
+    areas = shapely.area(np.asarray(polygons))
     return areas
 
-def filter_by_area(polygons: list, areas: list, min_area_sqm: float) -> tuple:
+def filter_by_area(polygons: np.ndarray, areas: np.ndarray, min_area_sqm: float) -> tuple:
     """Filter polygons by minimum area threshold."""
-    filtered = [(p, a) for p, a in zip(polygons, areas) if a >= min_area_sqm]
-    logger.info(f"Filtered from {len(polygons)} to {len(filtered)} polygons (min area: {min_area_sqm} sqm)")
-    
-    if filtered:
-        polygons_filtered, areas_filtered = zip(*filtered)
-        return list(polygons_filtered), list(areas_filtered)
-    return [], []
+    geoms = np.asarray(polygons)
+    keep = areas >= min_area_sqm
+    polygons_filtered = geoms[keep]
+    areas_filtered = areas[keep]
+    logger.info(f"Filtered from {len(geoms)} to {len(polygons_filtered)} polygons (min area: {min_area_sqm} sqm)")
+    return polygons_filtered, areas_filtered
+
+def filter_by_points(polygons: np.ndarray, areas: np.ndarray, tree: shapely.STRtree, min_points: int) -> tuple:
+    """Filter polygons by the minimum number of indexed points they contain."""
+    # Bulk query: one (polygon, point) pair per containment, polygons prepared by GEOS
+    polygon_idx, _ = tree.query(polygons, predicate="contains")
+    counts = np.bincount(polygon_idx, minlength=len(polygons))
+    keep = counts >= min_points
+    logger.info(f"Filtered from {len(polygons)} to {keep.sum()} polygons (min points: {min_points})")
+    return polygons[keep], areas[keep], counts[keep]
+
+def filter_by_area_and_points(
+    polygons: np.ndarray,
+    points_gdf: gpd.GeoDataFrame,
+    min_area_sqm: float,
+    min_points: int = 0
+) -> tuple:
+    """Filter polygons by minimum area, then count contained points and filter by min_points."""
+    areas = compute_areas(polygons, points_gdf.crs)
+    polygons_filtered, areas_filtered = filter_by_area(polygons, areas, min_area_sqm)
+    tree = shapely.STRtree(points_gdf.geometry.values)
+    return filter_by_points(polygons_filtered, areas_filtered, tree, min_points)
+
+def _empty_hotspots(proj_crs: str) -> gpd.GeoDataFrame:
+    """Empty hotspots GeoDataFrame with the output schema, in WGS84."""
+    return gpd.GeoDataFrame(
+        {'id': [], 'area_m2': [], 'point_count': []},
+        geometry=[],
+        crs=proj_crs
+    ).to_crs("EPSG:4326")
 
 def create_hotspots(
     gdf: gpd.GeoDataFrame,
     buffer_meters: float = 200,
     negative_buffer_meters: float = 0,
     min_area_sqm: float = 1000,
-    proj_crs: str = "EPSG:3857"
+    proj_crs: str = "EPSG:3857",
+    quad_segs: int = 8,
+    min_points: int = 0
 ) -> gpd.GeoDataFrame:
     """
     Create hotspot polygons from point data.
@@ -69,26 +128,25 @@ def create_hotspots(
     Pipeline:
     1. Reproject to metric CRS
     2. Buffer all points
-    3. Dissolve via unary_union
+    3. Dissolve via chunked parallel union
     4. Optional negative buffer
     5. Explode multipart geometries
-    6. Compute areas
-    7. Filter by min_area
-    8. Return GeoDataFrame with id and area_m2
+    6. Filter by min_area, then count contained points and filter by min_points
+    7. Return GeoDataFrame with id, area_m2 and point_count
     """
     logger.info(
         f"Creating hotspots: buffer={buffer_meters}m, "
         f"negative_buffer={negative_buffer_meters}m, "
-        f"min_area={min_area_sqm}sqm, proj_crs={proj_crs}"
+        f"min_area={min_area_sqm}sqm, min_points={min_points}, proj_crs={proj_crs}"
     )
     
     # Step 1: Reproject to metric CRS
     gdf_proj = reproject_to_metric(gdf, proj_crs)
     
     # Step 2: Buffer all points
-    buffered = buffer_points(gdf_proj, buffer_meters)
+    buffered = buffer_points(gdf_proj, buffer_meters, quad_segs)
     
-    # Step 3: Dissolve via unary union
+    # Step 3: Dissolve via chunked union
     union_geom = dissolve_geometries(buffered)
     
     # Step 4: Optional negative buffer
@@ -97,33 +155,27 @@ def create_hotspots(
     # Step 5: Explode multipart geometries
     polygons = explode_multipart(union_geom)
     
-    if not polygons:
+    if len(polygons) == 0:
         logger.warning("No polygons created after buffering and union")
-        return gpd.GeoDataFrame(
-            {'id': [], 'area_m2': []},
-            geometry=[],
-            crs=proj_crs
-        ).to_crs("EPSG:4326")
+        return _empty_hotspots(proj_crs)
     
-    # Step 6: Compute areas
-    areas = compute_areas(polygons, proj_crs)
-    
-    # Step 7: Filter by minimum area
-    polygons_filtered, areas_filtered = filter_by_area(polygons, areas, min_area_sqm)
+    # Step 6: Filter by minimum area and minimum point count
+    polygons_filtered, areas_filtered, point_counts = filter_by_area_and_points(
+        polygons, gdf_proj, min_area_sqm, min_points
+    )
     
-    if not polygons_filtered:
-        logger.warning(f"No polygons met minimum area threshold of {min_area_sqm} sqm")
-        return gpd.GeoDataFrame(
-            {'id': [], 'area_m2': []},
-            geometry=[],
-            crs=proj_crs
-        ).to_crs("EPSG:4326")
+    if len(polygons_filtered) == 0:
+        logger.warning(
+            f"No polygons met minimum area of {min_area_sqm} sqm and minimum points of {min_points}"
+        )
+        return _empty_hotspots(proj_crs)
     
-    # Step 8: Create GeoDataFrame with id and area_m2
+    # Step 7: Create GeoDataFrame with id, area_m2 and point_count
     hotspots_gdf = gpd.GeoDataFrame(
         {
             'id': range(len(polygons_filtered)),
-            'area_m2': areas_filtered
+            'area_m2': areas_filtered,
+            'point_count': point_counts
         },
         geometry=polygons_filtered,
         crs=proj_crs
@@ -133,7 +185,7 @@ def create_hotspots(
     hotspots_gdf = hotspots_gdf.to_crs("EPSG:4326")
     
     # Log statistics
-    total_area = sum(areas_filtered)
+    total_area = areas_filtered.sum()
     logger.info(
         f"Created {len(hotspots_gdf)} hotspot polygons, "
         f"total area: {total_area:,.0f} sqm"
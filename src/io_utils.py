@@ -1,9 +1,10 @@
+import numpy as np
+from functools import lru_cache
 import pandas as pd
 import geopandas as gpd
 from pathlib import Path
-from typing import Optional, Union
-from shapely.geometry import Point
-from pyproj import CRS
+from typing import Callable, List, Optional, Tuple, Union
+from pyproj import CRS, Transformer
 from src.logging_cfg import get_logger
 
 logger = get_logger(__name__)
@@ -11,151 +12,205 @@ logger = get_logger(__name__)
 class IOError(Exception):
     pass
 
+PARQUET_ROW_GROUP_SIZE = 20_000
+
+# Directories already created by this process, so repeated writes skip the mkdir syscalls
+_ensured_dirs: set[Path] = set()
+
+def ensure_dir(path: Path, recheck: bool = False) -> None:
+    """Create a directory (and parents) once per process.
+    
+    A cached directory is assumed to still exist. Writes from Python go through
+    write_in_dir, which recreates it if it was deleted since; callers handing the
+    directory to an external tool, where a failed write cannot be retried, pass
+    recheck=True to pay one stat instead.
+    """
+    if path in _ensured_dirs and (not recheck or path.is_dir()):
+        return
+    path.mkdir(parents=True, exist_ok=True)
+    _ensured_dirs.add(path)
+
+def write_in_dir(path: Path, write: Callable[[Path], None]) -> None:
+    """Run write(path) in an ensured parent directory, recreating it once if it vanished."""
+    ensure_dir(path.parent)
+    try:
+        write(path)
+    except Exception:
+        if path.parent.is_dir():
+            raise
+        # Deleted after it was cached, e.g. build/ removed while the process runs
+        _ensured_dirs.discard(path.parent)
+        ensure_dir(path.parent)
+        write(path)
+
+@lru_cache(maxsize=32)
+def _get_crs(crs: str) -> CRS:
+    return CRS.from_user_input(crs)
+
+@lru_cache(maxsize=32)
+def _get_transformer(src: str, dst: str) -> Transformer:
+    # Building a CRS-to-CRS pipeline is costly; reuse it across chunks and calls
+    return Transformer.from_crs(_get_crs(src), _get_crs(dst), always_xy=True)
+
+def _norm(name: str) -> str:
+    return name.strip().lower().replace(' ', '_').replace('-', '_')
+
 def normalize_column_names(df: pd.DataFrame) -> pd.DataFrame:
-    df.columns = [col.strip().lower().replace(' ', '_').replace('-', '_') for col in df.columns]
+    df.columns = df.columns.str.strip().str.lower().str.replace(r'[ -]', '_', regex=True)
     return df
 
-def read_csv_to_gdf(
-    csv_path: Union[str, Path],
+def _to_text(value) -> str:
+    # Integer columns come back as float in blocks that contain NaNs
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def stringify_mixed_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Malformed rows can leave object columns holding both numbers and strings,
+    # which Parquet cannot store; keep such columns as text, as GDAL would
+    for col in df.select_dtypes(include='object').columns:
+        if pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed'):
+            df[col] = df[col].where(df[col].isna(), df[col].map(_to_text))
+    return df
+
+def _process_chunk(
+    df: pd.DataFrame,
     lon_col: Optional[str] = None,
     lat_col: Optional[str] = None,
     x_col: Optional[str] = None,
     y_col: Optional[str] = None,
     src_crs: Optional[str] = None
 ) -> gpd.GeoDataFrame:
-    csv_path = Path(csv_path)
-    
-    if not csv_path.exists():
-        raise IOError(f"CSV file not found: {csv_path}")
-    
-    logger.info(f"Reading CSV from {csv_path}")
-    
-    try:
-        df = pd.read_csv(csv_path)
-        initial_count = len(df)
-        logger.info(f"Read {initial_count} rows from CSV", extra={"rows": initial_count})
-    except Exception as e:
-        logger.error(f"Failed to read CSV: {e}")
-        raise IOError(f"Failed to read CSV: {e}")
-    
+    """Normalize, validate and geocode one block of CSV rows."""
     df = normalize_column_names(df)
-    logger.debug(f"Normalized column names: {list(df.columns)[:10]}")
     
     if lon_col and lat_col:
-        lon_col_norm = lon_col.lower().replace(' ', '_').replace('-', '_')
-        lat_col_norm = lat_col.lower().replace(' ', '_').replace('-', '_')
+        lon_col_norm = _norm(lon_col)
+        lat_col_norm = _norm(lat_col)
         
         if lon_col_norm not in df.columns or lat_col_norm not in df.columns:
             available_cols = list(df.columns)
             raise IOError(f"Columns {lon_col}/{lat_col} not found. Available: {available_cols[:20]}")
         
-        logger.info(f"Using lon/lat columns: {lon_col_norm}, {lat_col_norm}")
-        
-        df_valid = df.dropna(subset=[lon_col_norm, lat_col_norm])
-        dropped = len(df) - len(df_valid)
-        if dropped > 0:
-            logger.warning(f"Dropped {dropped} rows with missing coordinates")
-        
         try:
-            df_valid = df_valid.copy()
-            df_valid[lon_col_norm] = pd.to_numeric(df_valid[lon_col_norm], errors='coerce')
-            df_valid[lat_col_norm] = pd.to_numeric(df_valid[lat_col_norm], errors='coerce')
-            df_valid = df_valid.dropna(subset=[lon_col_norm, lat_col_norm])
+            # Coerce on the chunk itself so a single dropna yields the only copy
+            df[lon_col_norm] = pd.to_numeric(df[lon_col_norm], errors='coerce')
+            df[lat_col_norm] = pd.to_numeric(df[lat_col_norm], errors='coerce')
+            df_valid = df.dropna(subset=[lon_col_norm, lat_col_norm])
+            dropped = len(df) - len(df_valid)
+            if dropped > 0:
+                logger.warning(f"Dropped {dropped} rows with missing or non-numeric coordinates")
+            
+            # Points built from finite coordinates are always valid, so this
+            # replaces a per-geometry GEOS is_valid pass
+            lon = df_valid[lon_col_norm].to_numpy(dtype=np.float64)
+            lat = df_valid[lat_col_norm].to_numpy(dtype=np.float64)
+            finite = np.isfinite(lon) & np.isfinite(lat)
+            if not finite.all():
+                logger.warning(f"Found {(~finite).sum()} non-finite coordinates, removing them")
+                df_valid = df_valid[finite]
+                lon, lat = lon[finite], lat[finite]
             
-            if df_valid[lon_col_norm].min() < -180 or df_valid[lon_col_norm].max() > 180:
+            # One pass per axis over the finite arrays instead of a min and a max
+            if (np.abs(lon) > 180).any():
                 logger.warning("Longitude values outside [-180, 180] range")
-            if df_valid[lat_col_norm].min() < -90 or df_valid[lat_col_norm].max() > 90:
+            if (np.abs(lat) > 90).any():
                 logger.warning("Latitude values outside [-90, 90] range")
             
-            geometry = gpd.points_from_xy(df_valid[lon_col_norm], df_valid[lat_col_norm])
-            gdf = gpd.GeoDataFrame(df_valid, geometry=geometry, crs="EPSG:4326")
+            # Plain float64 arrays go straight to shapely.points without coercion
+            geometry = gpd.points_from_xy(lon, lat)
+            # Dropped rows leave gaps in the index, which to_parquet would store
+            return gpd.GeoDataFrame(df_valid.reset_index(drop=True), geometry=geometry, crs="EPSG:4326")
         except Exception as e:
             logger.error(f"Failed to create geometry from lon/lat: {e}")
             raise IOError(f"Failed to create geometry from lon/lat: {e}")
-            
-    elif x_col and y_col and src_crs:
-        x_col_norm = x_col.lower().replace(' ', '_').replace('-', '_')
-        y_col_norm = y_col.lower().replace(' ', '_').replace('-', '_')
-        
-        if x_col_norm not in df.columns or y_col_norm not in df.columns:
-            available_cols = list(df.columns)
-            raise IOError(f"Columns {x_col}/{y_col} not found. Available: {available_cols[:20]}")
-        
-        logger.info(f"Using x/y columns: {x_col_norm}, {y_col_norm} with CRS: {src_crs}")
-        
+    
+    x_col_norm = _norm(x_col)
+    y_col_norm = _norm(y_col)
+    
+    if x_col_norm not in df.columns or y_col_norm not in df.columns:
+        available_cols = list(df.columns)
+        raise IOError(f"Columns {x_col}/{y_col} not found. Available: {available_cols[:20]}")
+    
+    try:
+        # Coerce on the chunk itself so a single dropna yields the only copy
+        df[x_col_norm] = pd.to_numeric(df[x_col_norm], errors='coerce')
+        df[y_col_norm] = pd.to_numeric(df[y_col_norm], errors='coerce')
         df_valid = df.dropna(subset=[x_col_norm, y_col_norm])
         dropped = len(df) - len(df_valid)
         if dropped > 0:
-            logger.warning(f"Dropped {dropped} rows with missing coordinates")
+            logger.warning(f"Dropped {dropped} rows with missing or non-numeric coordinates")
         
-        try:
-            df_valid = df_valid.copy()
-            df_valid[x_col_norm] = pd.to_numeric(df_valid[x_col_norm], errors='coerce')
-            df_valid[y_col_norm] = pd.to_numeric(df_valid[y_col_norm], errors='coerce')
-            df_valid = df_valid.dropna(subset=[x_col_norm, y_col_norm])
-            
-            # Workaround for Python 3.13 pyproj issue: 
-            # Create GeoDataFrame, save with GDAL, read back
-            geometry = gpd.points_from_xy(df_valid[x_col_norm], df_valid[y_col_norm])
-            gdf = gpd.GeoDataFrame(df_valid, geometry=geometry)
-            
-            # Save to temporary file with CRS
-            import tempfile
-            import subprocess
-            
-            with tempfile.NamedTemporaryFile(suffix='.geojson', delete=False) as tmp:
-                temp_path = tmp.name
-            
-            # Save without CRS first - use fiona to avoid pyproj
-            import json
-            features = []
-            for idx, row in df_valid.iterrows():
-                features.append({
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [float(row[x_col_norm]), float(row[y_col_norm])]
-                    },
-                    "properties": {k: v for k, v in row.items() if k not in [x_col_norm, y_col_norm]}
-                })
-            
-            geojson_dict = {
-                "type": "FeatureCollection",
-                "features": features
-            }
-            
-            with open(temp_path, 'w') as f:
-                json.dump(geojson_dict, f)
-            
-            # Use ogr2ogr to assign and transform CRS
-            temp_out = temp_path.replace('.geojson', '_4326.geojson')
-            cmd = [
-                'ogr2ogr', '-f', 'GeoJSON',
-                '-s_srs', src_crs,
-                '-t_srs', 'EPSG:4326',
-                temp_out, temp_path
-            ]
-            subprocess.run(cmd, check=True, capture_output=True)
-            
-            # Read back the transformed file
-            gdf = gpd.read_file(temp_out)
-            
-            # Clean up temp files
-            Path(temp_path).unlink(missing_ok=True)
-            Path(temp_out).unlink(missing_ok=True)
-            
-            logger.info(f"Transformed {len(gdf)} points from {src_crs} to WGS84 using GDAL")
-        except Exception as e:
-            logger.error(f"Failed to create geometry from x/y: {e}")
-            raise IOError(f"Failed to create geometry from x/y: {e}")
+        # Reproject all coordinates in one batched pyproj call
+        x = df_valid[x_col_norm].to_numpy(dtype=np.float64)
+        y = df_valid[y_col_norm].to_numpy(dtype=np.float64)
+        lon, lat = _get_transformer(src_crs, "EPSG:4326").transform(x, y)
+        
+        # pyproj reports points it cannot transform as inf
+        finite = np.isfinite(lon) & np.isfinite(lat)
+        if not finite.all():
+            logger.warning(f"Found {(~finite).sum()} non-finite coordinates, removing them")
+            df_valid = df_valid[finite]
+            lon, lat = lon[finite], lat[finite]
+        
+        gdf = gpd.GeoDataFrame(
+            df_valid.drop(columns=[x_col_norm, y_col_norm]).reset_index(drop=True),
+            geometry=gpd.points_from_xy(lon, lat),
+            crs="EPSG:4326"
+        )
+        
+        logger.debug(f"Transformed {len(gdf)} points from {src_crs} to WGS84 using pyproj")
+        return gdf
+    except Exception as e:
+        logger.error(f"Failed to create geometry from x/y: {e}")
+        raise IOError(f"Failed to create geometry from x/y: {e}")
+
+def read_csv_to_gdf(
+    csv_path: Union[str, Path],
+    lon_col: Optional[str] = None,
+    lat_col: Optional[str] = None,
+    x_col: Optional[str] = None,
+    y_col: Optional[str] = None,
+    src_crs: Optional[str] = None,
+    chunksize: Optional[int] = None
+) -> gpd.GeoDataFrame:
+    csv_path = Path(csv_path)
+    
+    if not csv_path.exists():
+        raise IOError(f"CSV file not found: {csv_path}")
+    
+    if lon_col and lat_col:
+        logger.info(f"Using lon/lat columns: {_norm(lon_col)}, {_norm(lat_col)}")
+    elif x_col and y_col and src_crs:
+        logger.info(f"Using x/y columns: {_norm(x_col)}, {_norm(y_col)} with CRS: {src_crs}")
     else:
         raise IOError("Must provide either lon_col/lat_col or x_col/y_col/src_crs")
     
-    valid_geom = gdf.geometry.is_valid
-    if not valid_geom.all():
-        invalid_count = (~valid_geom).sum()
-        logger.warning(f"Found {invalid_count} invalid geometries, removing them")
-        gdf = gdf[valid_geom]
+    logger.info(f"Reading CSV from {csv_path}")
+    
+    # Both paths parse with the same C-engine settings and go through the same
+    # per-chunk processing; chunking only bounds how many raw rows are held at once
+    gdfs = []
+    initial_count = 0
+    try:
+        chunks = pd.read_csv(csv_path, chunksize=chunksize) if chunksize else [pd.read_csv(csv_path)]
+        for chunk in chunks:
+            initial_count += len(chunk)
+            gdfs.append(_process_chunk(chunk, lon_col, lat_col, x_col, y_col, src_crs))
+    except IOError:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to read CSV: {e}")
+        raise IOError(f"Failed to read CSV: {e}")
+    chunk_note = f" in {len(gdfs)} chunks" if chunksize else ""
+    logger.info(f"Read {initial_count} rows from CSV{chunk_note}", extra={"rows": initial_count})
+    if not gdfs:
+        raise IOError(f"CSV file is empty: {csv_path}")
+    gdf = gdfs[0] if len(gdfs) == 1 else pd.concat(gdfs, ignore_index=True)
+    
+    # Run after concatenation: chunks may infer different dtypes for one column
+    gdf = stringify_mixed_columns(gdf)
+    logger.debug(f"Normalized column names: {list(gdf.columns)[:10]}")
     
     final_count = len(gdf)
     logger.info(
@@ -173,17 +228,36 @@ def read_csv_to_gdf(
 def save_gdf(
     gdf: gpd.GeoDataFrame,
     parquet_path: Optional[Union[str, Path]] = None,
-    geojson_path: Optional[Union[str, Path]] = None
+    geojson_path: Optional[Union[str, Path]] = None,
+    fgb_path: Optional[Union[str, Path]] = None
 ):
-    if not parquet_path and not geojson_path:
+    if not parquet_path and not geojson_path and not fgb_path:
         raise IOError("Must provide at least one output path")
     
     if parquet_path:
         parquet_path = Path(parquet_path)
-        parquet_path.parent.mkdir(parents=True, exist_ok=True)
-        
         try:
-            gdf.to_parquet(parquet_path)
+            # Bounded row groups carry bbox statistics so readers can skip those
+            # outside a query bbox. Points get them from native geoarrow encoding;
+            # other geometries need a bbox covering column, which for points
+            # would double the file size
+            if len(gdf) and (gdf.geom_type == "Point").all():
+                layout = {"geometry_encoding": "geoarrow"}
+            else:
+                layout = {"write_covering_bbox": True}
+            # Those statistics only prune if each row group covers a compact area,
+            # so order rows along a Hilbert curve once there is more than one group
+            ordered = gdf
+            if len(gdf) > PARQUET_ROW_GROUP_SIZE:
+                order = np.argsort(gdf.geometry.hilbert_distance().to_numpy(), kind="stable")
+                ordered = gdf.iloc[order].reset_index(drop=True)
+            write_in_dir(parquet_path, lambda path: ordered.to_parquet(
+                path,
+                compression="zstd",
+                compression_level=3,
+                row_group_size=PARQUET_ROW_GROUP_SIZE,
+                **layout
+            ))
             file_size_mb = parquet_path.stat().st_size / (1024 * 1024)
             logger.info(
                 f"Saved {len(gdf)} records to {parquet_path}",
@@ -195,10 +269,9 @@ def save_gdf(
     
     if geojson_path:
         geojson_path = Path(geojson_path)
-        geojson_path.parent.mkdir(parents=True, exist_ok=True)
-        
         try:
-            gdf.to_file(geojson_path, driver="GeoJSON")
+            # pyogrio hands whole columns to GDAL instead of Fiona's per-feature loop
+            write_in_dir(geojson_path, lambda path: gdf.to_file(path, driver="GeoJSON", engine="pyogrio"))
             file_size_mb = geojson_path.stat().st_size / (1024 * 1024)
             logger.info(
                 f"Saved {len(gdf)} records to {geojson_path}",
@@ -207,20 +280,48 @@ def save_gdf(
         except Exception as e:
             logger.error(f"Failed to save GeoJSON: {e}")
             raise IOError(f"Failed to save GeoJSON: {e}")
+    
+    if fgb_path:
+        fgb_path = Path(fgb_path)
+        try:
+            # Binary tippecanoe input that skips GeoJSON text parsing. tippecanoe
+            # streams it sequentially, so the packed R-tree is not worth building
+            write_in_dir(fgb_path, lambda path: gdf.to_file(
+                path, driver="FlatGeobuf", engine="pyogrio", SPATIAL_INDEX="NO"
+            ))
+            file_size_mb = fgb_path.stat().st_size / (1024 * 1024)
+            logger.info(
+                f"Saved {len(gdf)} records to {fgb_path}",
+                extra={"records": len(gdf), "size_mb": round(file_size_mb, 2)}
+            )
+        except Exception as e:
+            logger.error(f"Failed to save FlatGeobuf: {e}")
+            raise IOError(f"Failed to save FlatGeobuf: {e}")
 
 def load_gdf(
-    file_path: Union[str, Path]
+    file_path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None
 ) -> gpd.GeoDataFrame:
     file_path = Path(file_path)
     
     if not file_path.exists():
         raise IOError(f"File not found: {file_path}")
     
+    # columns selects attribute columns; the geometry is always read
+    attributes = [c for c in columns if c != "geometry"] if columns is not None else None
+    
     try:
         if file_path.suffix == '.parquet':
-            gdf = gpd.read_parquet(file_path)
-        elif file_path.suffix in ['.geojson', '.json']:
-            gdf = gpd.read_file(file_path)
+            # Only the requested columns are decoded, and row groups whose
+            # bbox statistics miss the query bbox are skipped entirely
+            gdf = gpd.read_parquet(
+                file_path,
+                columns=attributes + ["geometry"] if attributes is not None else None,
+                bbox=bbox
+            )
+        elif file_path.suffix in ['.geojson', '.json', '.fgb']:
+            gdf = gpd.read_file(file_path, columns=attributes, bbox=bbox)
         else:
             raise IOError(f"Unsupported file format: {file_path.suffix}")
         
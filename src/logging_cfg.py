@@ -1,25 +1,30 @@
 from loguru import logger
+import os
 import sys
 import json
 
 def setup_logging(level: str = "INFO"):
     logger.remove()
     
+    # Extended tracebacks walk the stack and dump local variables on every
+    # exception; keep them off unless explicitly asked for with LB_LOG_DIAGNOSE=1
+    diagnose = os.environ.get("LB_LOG_DIAGNOSE", "0").lower() in ("1", "true", "yes")
+    
     logger.add(
         sys.stdout,
         format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {module}:{function}:{line} - {message}",
         level=level,
         serialize=False,
-        backtrace=True,
-        diagnose=True
+        backtrace=diagnose,
+        diagnose=diagnose
     )
     
     logger.add(
         sys.stderr,
         level="ERROR",
         format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {module}:{function}:{line} - {message}",
-        backtrace=True,
-        diagnose=True,
+        backtrace=diagnose,
+        diagnose=diagnose,
         filter=lambda record: record["level"].no >= 40
     )
     
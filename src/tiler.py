@@ -1,8 +1,13 @@
 import subprocess
 import json
+import re
 import shutil
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, Dict, Any
+from src.io_utils import ensure_dir
 from src.logging_cfg import get_logger
 
 logger = get_logger(__name__)
@@ -11,7 +16,47 @@ def check_command_exists(command: str) -> bool:
     """Check if a command exists in the system PATH."""
     return shutil.which(command) is not None
 
-def run_tippecanoe(
+def _stream_output(process: subprocess.Popen, name: str) -> str:
+    """Log a process's output line by line as it runs; return the last lines for error reports."""
+    tail = deque(maxlen=20)
+    for line in process.stdout:
+        line = line.rstrip()
+        if line:
+            logger.debug(f"{name}: {line}")
+            tail.append(line)
+    process.wait()
+    return "\n".join(tail)
+
+@lru_cache(maxsize=None)
+def tippecanoe_writes_pmtiles() -> bool:
+    """Check whether tippecanoe can write PMTiles directly (felt/tippecanoe >= 2.17)."""
+    if not check_command_exists("tippecanoe"):
+        return False
+    
+    result = subprocess.run(["tippecanoe", "--help"], capture_output=True, text=True)
+    if "pmtiles" in (result.stdout + result.stderr).lower():
+        return True
+    
+    # Older builds print only the version banner; PMTiles output arrived in 2.17
+    result = subprocess.run(["tippecanoe", "--version"], capture_output=True, text=True)
+    match = re.search(r"v?(\d+)\.(\d+)", result.stdout + result.stderr)
+    return bool(match) and (int(match.group(1)), int(match.group(2))) >= (2, 17)
+
+def tippecanoe_reads_flatgeobuf() -> bool:
+    """Check whether tippecanoe accepts FlatGeobuf input (felt/tippecanoe, before PMTiles output landed)."""
+    return tippecanoe_writes_pmtiles()
+
+def _tippecanoe_input(path: Path) -> Path:
+    """Swap a .fgb input for its sibling .geojson when tippecanoe cannot read FlatGeobuf."""
+    if path.suffix != ".fgb" or tippecanoe_reads_flatgeobuf():
+        return path
+    geojson = path.with_suffix(".geojson")
+    if not geojson.exists():
+        raise RuntimeError(f"tippecanoe cannot read FlatGeobuf and {geojson} does not exist")
+    logger.info(f"tippecanoe cannot read FlatGeobuf, using {geojson}")
+    return geojson
+
+def _spawn_tippecanoe(
     geojson_path: Path,
     output_path: Path,
     layer_name: str,
@@ -19,26 +64,15 @@ def run_tippecanoe(
     max_zoom: int = 14,
     drop_densest: bool = True,
     preserve_attributes: bool = True
-) -> Path:
-    """
-    Run tippecanoe to build MBTiles from GeoJSON.
-    
-    Args:
-        geojson_path: Input GeoJSON file
-        output_path: Output MBTiles file path
-        layer_name: Name for the vector tile layer
-        min_zoom: Minimum zoom level
-        max_zoom: Maximum zoom level
-        drop_densest: Whether to drop densest features as needed
-        preserve_attributes: Whether to preserve all attributes
-    """
+) -> subprocess.Popen:
+    """Start tippecanoe without waiting for it; see run_tippecanoe for the arguments."""
     if not check_command_exists("tippecanoe"):
         raise RuntimeError("tippecanoe not found in PATH")
     
     logger.info(f"Running tippecanoe for {geojson_path}")
     logger.info(f"Layer: {layer_name}, zoom range: {min_zoom}-{max_zoom}")
     
-    output_path.parent.mkdir(parents=True, exist_ok=True)
+    ensure_dir(output_path.parent, recheck=True)
     
     cmd = [
         "tippecanoe",
@@ -61,20 +95,60 @@ def run_tippecanoe(
     
     logger.debug(f"Command: {' '.join(cmd)}")
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    # Progress goes to stderr; merge it into one pipe that is read as it arrives
+    # rather than buffering the whole (potentially huge) log in memory
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+def _wait_tippecanoe(process: subprocess.Popen, output_path: Path, layer_name: str) -> Path:
+    """Wait for a spawned tippecanoe and check that it produced its output."""
+    # Layers may run concurrently, so tag their interleaved output with the layer
+    output = _stream_output(process, f"tippecanoe[{layer_name}]")
     
-    if result.returncode != 0:
-        logger.error(f"Tippecanoe failed: {result.stderr}")
-        raise RuntimeError(f"Tippecanoe failed: {result.stderr}")
+    if process.returncode != 0:
+        logger.error(f"Tippecanoe failed for layer {layer_name}: {output}")
+        raise RuntimeError(f"Tippecanoe failed for layer {layer_name}: {output}")
     
+    tile_format = "PMTiles" if output_path.suffix == ".pmtiles" else "MBTiles"
     if output_path.exists():
         file_size_mb = output_path.stat().st_size / (1024 * 1024)
-        logger.info(f"Created MBTiles at {output_path} ({file_size_mb:.2f} MB)")
+        logger.info(f"Created {tile_format} at {output_path} ({file_size_mb:.2f} MB)")
     else:
-        raise RuntimeError(f"MBTiles file not created: {output_path}")
+        raise RuntimeError(f"{tile_format} file not created: {output_path}")
     
     return output_path
 
+def run_tippecanoe(
+    geojson_path: Path,
+    output_path: Path,
+    layer_name: str,
+    min_zoom: int = 4,
+    max_zoom: int = 14,
+    drop_densest: bool = True,
+    preserve_attributes: bool = True
+) -> Path:
+    """
+    Run tippecanoe to build MBTiles or PMTiles from GeoJSON or FlatGeobuf.
+    
+    Args:
+        geojson_path: Input GeoJSON or FlatGeobuf (.fgb) file; tippecanoe picks the parser by suffix
+        output_path: Output file path; a .pmtiles suffix makes tippecanoe write PMTiles
+        layer_name: Name for the vector tile layer
+        min_zoom: Minimum zoom level
+        max_zoom: Maximum zoom level
+        drop_densest: Whether to drop densest features as needed
+        preserve_attributes: Whether to preserve all attributes
+    """
+    process = _spawn_tippecanoe(
+        geojson_path,
+        output_path,
+        layer_name,
+        min_zoom=min_zoom,
+        max_zoom=max_zoom,
+        drop_densest=drop_densest,
+        preserve_attributes=preserve_attributes
+    )
+    return _wait_tippecanoe(process, output_path, layer_name)
+
 def mbtiles_to_pmtiles(mbtiles_path: Path, pmtiles_path: Path) -> Path:
     """Convert MBTiles to PMTiles format."""
     if not check_command_exists("pmtiles"):
@@ -84,16 +158,17 @@ def mbtiles_to_pmtiles(mbtiles_path: Path, pmtiles_path: Path) -> Path:
     
     logger.info(f"Converting {mbtiles_path} to PMTiles")
     
-    pmtiles_path.parent.mkdir(parents=True, exist_ok=True)
+    ensure_dir(pmtiles_path.parent, recheck=True)
     
     cmd = ["pmtiles", "convert", str(mbtiles_path), str(pmtiles_path)]
     
     logger.debug(f"Command: {' '.join(cmd)}")
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    output = _stream_output(process, "pmtiles")
     
-    if result.returncode != 0:
-        logger.error(f"PMTiles conversion failed: {result.stderr}")
+    if process.returncode != 0:
+        logger.error(f"PMTiles conversion failed: {output}")
         logger.warning("Falling back to MBTiles format")
         shutil.copy2(mbtiles_path, pmtiles_path.with_suffix('.mbtiles'))
         return pmtiles_path.with_suffix('.mbtiles')
@@ -118,8 +193,8 @@ def package_tiles(
     Package point and polygon data into vector tiles.
     
     Args:
-        points_geojson: Path to points GeoJSON file
-        polys_geojson: Path to polygons GeoJSON file
+        points_geojson: Path to points GeoJSON or FlatGeobuf file
+        polys_geojson: Path to polygons GeoJSON or FlatGeobuf file
         docs_dir: Output directory for tiles
         min_zoom: Minimum zoom level
         max_zoom: Maximum zoom level
@@ -133,32 +208,45 @@ def package_tiles(
     docs_dir = Path(docs_dir)
     
     if not points_geojson.exists():
-        raise FileNotFoundError(f"Points GeoJSON not found: {points_geojson}")
+        raise FileNotFoundError(f"Points input not found: {points_geojson}")
     if not polys_geojson.exists():
-        raise FileNotFoundError(f"Polygons GeoJSON not found: {polys_geojson}")
+        raise FileNotFoundError(f"Polygons input not found: {polys_geojson}")
     
-    temp_dir = Path("build/temp_tiles")
-    temp_dir.mkdir(parents=True, exist_ok=True)
+    points_geojson = _tippecanoe_input(points_geojson)
+    polys_geojson = _tippecanoe_input(polys_geojson)
     
     options = tippecanoe_options or {}
+    ensure_dir(docs_dir, recheck=True)
+    
+    points_pmtiles = docs_dir / "listed_buildings.pmtiles"
+    hotspots_pmtiles = docs_dir / "hotspots.pmtiles"
     
-    # Process points layer
-    points_mbtiles = temp_dir / "listed_buildings.mbtiles"
-    run_tippecanoe(
+    # Let tippecanoe write PMTiles itself when it can, saving a full
+    # read and rewrite of each tileset through an intermediate MBTiles
+    direct = tippecanoe_writes_pmtiles()
+    if direct:
+        points_out, hotspots_out = points_pmtiles, hotspots_pmtiles
+    else:
+        logger.info("tippecanoe cannot write PMTiles, converting from MBTiles")
+        temp_dir = Path("build/temp_tiles")
+        ensure_dir(temp_dir, recheck=True)
+        points_out = temp_dir / "listed_buildings.mbtiles"
+        hotspots_out = temp_dir / "hotspots.mbtiles"
+    
+    # The layers are independent, so build both at once and drain their
+    # output pipes from separate threads so neither blocks on a full pipe
+    points_process = _spawn_tippecanoe(
         points_geojson,
-        points_mbtiles,
+        points_out,
         "listed_buildings",
         min_zoom=min_zoom,
         max_zoom=max_zoom,
         drop_densest=options.get("drop_densest_points", True),
         preserve_attributes=True
     )
-    
-    # Process hotspots layer
-    hotspots_mbtiles = temp_dir / "hotspots.mbtiles"
-    run_tippecanoe(
+    hotspots_process = _spawn_tippecanoe(
         polys_geojson,
-        hotspots_mbtiles,
+        hotspots_out,
         "hotspots",
         min_zoom=min_zoom,
         max_zoom=max_zoom,
@@ -166,21 +254,24 @@ def package_tiles(
         preserve_attributes=True
     )
     
-    # Convert to PMTiles and move to docs directory
-    docs_dir.mkdir(parents=True, exist_ok=True)
-    
-    points_pmtiles = docs_dir / "listed_buildings.pmtiles"
-    points_final = mbtiles_to_pmtiles(points_mbtiles, points_pmtiles)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        points_future = executor.submit(_wait_tippecanoe, points_process, points_out, "listed_buildings")
+        hotspots_future = executor.submit(_wait_tippecanoe, hotspots_process, hotspots_out, "hotspots")
+        points_future.result()
+        hotspots_future.result()
     
-    hotspots_pmtiles = docs_dir / "hotspots.pmtiles"
-    hotspots_final = mbtiles_to_pmtiles(hotspots_mbtiles, hotspots_pmtiles)
-    
-    # Clean up temp files
-    try:
-        points_mbtiles.unlink(missing_ok=True)
-        hotspots_mbtiles.unlink(missing_ok=True)
-    except Exception as e:
-        logger.warning(f"Could not clean up temp files: {e}")
+    if direct:
+        points_final, hotspots_final = points_pmtiles, hotspots_pmtiles
+    else:
+        points_final = mbtiles_to_pmtiles(points_out, points_pmtiles)
+        hotspots_final = mbtiles_to_pmtiles(hotspots_out, hotspots_pmtiles)
+        
+        # Clean up temp files
+        try:
+            points_out.unlink(missing_ok=True)
+            hotspots_out.unlink(missing_ok=True)
+        except Exception as e:
+            logger.warning(f"Could not clean up temp files: {e}")
     
     logger.info(f"Packaging complete. Tiles saved to {docs_dir}")
     